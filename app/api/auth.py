@@ -2,26 +2,33 @@
 Authentication API endpoints for user registration, login, and session management.
 """
 
+from typing import Optional
+
 from fastapi import APIRouter, Depends, HTTPException, Request, Response
-from jose import JWTError
+from jwt import PyJWTError
+from app.core.cache import cache_user, get_cached_user, user_changed_since
 from app.core.database import get_db_connection
 
 from app.schemas.auth import RegisterInput, LoginInput, Token
 from app.schemas.users import User
-from app.core.security import create_access_token, decode_token, hash_password, verify_password
+from app.core.security import DUMMY_PASSWORD_HASH, create_access_token, decode_token, hash_password_async, password_needs_rehash, revoke_token, verify_password_async
 
 router = APIRouter()
 COOKIE_NAME = "access_token"
 
-async def get_current_user(request: Request) -> User:
-    """Get current authenticated user from JWT token."""
-    # Get token from cookie or Authorization header
+def get_request_token(request: Request) -> Optional[str]:
+    """Get the JWT token from the cookie or the Authorization header."""
     token = request.cookies.get(COOKIE_NAME)
     if not token:
         auth = request.headers.get("Authorization")
-        if auth and auth.lower().startswith("bearer "):
-            token = auth.split(" ", 1)[1]
-    
+        # Only lowercase the scheme prefix, not the whole header
+        if auth and len(auth) > 7 and auth[:7].lower() == "bearer ":
+            token = auth[7:]
+    return token
+
+async def get_current_user(request: Request) -> User:
+    """Get current authenticated user from JWT token."""
+    token = get_request_token(request)
     if not token:
         raise HTTPException(status_code=401, detail="Not authenticated")
     
@@ -31,67 +38,102 @@ async def get_current_user(request: Request) -> User:
         if not user_id_str:
             raise HTTPException(status_code=401, detail="Invalid token")
         user_id = int(user_id_str)
-    except (JWTError, ValueError, TypeError):
+    except (PyJWTError, ValueError, TypeError):
         raise HTTPException(status_code=401, detail="Invalid token")
 
+    # Tokens issued at login carry the user's fields, so no lookup is needed
+    # unless the user changed after the token was issued
+    name, email = payload.get("name"), payload.get("email")
+    if name is not None and email is not None and not user_changed_since(user_id, payload.get("iat", 0)):
+        return User.model_construct(id=user_id, name=name, email=email)
+
+    # Serve repeat requests from the in-process cache
+    user = get_cached_user(user_id)
+    if user is not None:
+        return user
+
     # Get user from database
     async with get_db_connection() as conn:
-        with conn.cursor() as cur:
-            cur.execute("SELECT id, name, email FROM test_users WHERE id = %s", (user_id,))
-            row = cur.fetchone()
+        async with conn.cursor() as cur:
+            await cur.execute("SELECT id, name, email FROM test_users WHERE id = %s", (user_id,))
+            row = await cur.fetchone()
             if not row:
                 raise HTTPException(status_code=401, detail="User not found")
-            return User(id=row[0], name=row[1], email=row[2])
+            user = User.model_construct(id=row[0], name=row[1], email=row[2])
+            cache_user(user)
+            return user
 
 @router.post("/auth/register", response_model=User, status_code=201)
 async def register(body: RegisterInput) -> User:
     """Register a new user account."""
+    # Hash before taking a connection so it is not held while hashing
+    hashed_pw = await hash_password_async(body.password)
     async with get_db_connection() as conn:
-        with conn.cursor() as cur:
-            
-            # Check if email already exists
-            cur.execute("SELECT 1 FROM test_users WHERE email = %s", (body.email,))
-            if cur.fetchone():
-                raise HTTPException(status_code=409, detail="Email already registered")
-            
-            # Create user
-            hashed_pw = hash_password(body.password)
-            cur.execute(
-                "INSERT INTO test_users (name, email, hashed_password) VALUES (%s, %s, %s) RETURNING id",
-                (body.name, body.email, hashed_pw),
-            )
-            result = cur.fetchone()
+        async with conn.cursor() as cur:
+            async with conn.transaction():
+                # Create user; the unique index on email makes this atomic
+                # (see migrations/001_test_users_email_unique.sql)
+                await cur.execute(
+                    "INSERT INTO test_users (name, email, hashed_password) VALUES (%s, %s, %s) "
+                    "ON CONFLICT (email) DO NOTHING RETURNING id",
+                    (body.name, body.email, hashed_pw),
+                )
+                result = await cur.fetchone()
             if not result:
-                raise HTTPException(status_code=500, detail="Failed to create user")
-            user_id = result[0]
-            conn.commit()
-            return User(id=user_id, name=body.name, email=body.email)
+                raise HTTPException(status_code=409, detail="Email already registered")
+            return User(id=result[0], name=body.name, email=body.email)
 
 @router.post("/auth/login", response_model=Token)
-async def login(body: LoginInput, response: Response) -> Token:
+async def login(body: LoginInput) -> Response:
     """Login and get JWT token."""
     async with get_db_connection() as conn:
-        with conn.cursor() as cur:
-            cur.execute(
+        async with conn.cursor() as cur:
+            await cur.execute(
                 "SELECT id, name, email, hashed_password FROM test_users WHERE email = %s",
                 (body.email,),
             )
-            row = cur.fetchone()
-            if not row or not verify_password(body.password, row[3]):
-                raise HTTPException(status_code=401, detail="Invalid credentials")
-
-            token = create_access_token(subject=row[0])
-            
-            # Set cookie
-            response.set_cookie(
-                key=COOKIE_NAME,
-                value=token,
-                httponly=True,
-                samesite="lax",
-                secure=False,
-                max_age=60 * 15,
-            )
-            return Token(access_token=token)
+            row = await cur.fetchone()
+
+    # Verify after giving the connection back, so logins waiting on the
+    # hashing threads do not hold pool connections other requests need.
+    # Users created through /users have no password and can never log in.
+    has_password = bool(row and row[3])
+    hashed_pw = row[3] if row and row[3] else DUMMY_PASSWORD_HASH
+    password_ok = await verify_password_async(body.password, hashed_pw)
+    if not row or not has_password or not password_ok:
+        raise HTTPException(status_code=401, detail="Invalid credentials")
+
+    # Upgrade legacy hashes while the plain password is at hand
+    if password_needs_rehash(hashed_pw):
+        new_hashed_pw = await hash_password_async(body.password)
+        async with get_db_connection() as conn:
+            async with conn.cursor() as cur:
+                async with conn.transaction():
+                    # Skip the upgrade if the password changed in the meantime
+                    await cur.execute(
+                        "UPDATE test_users SET hashed_password = %s WHERE id = %s AND hashed_password = %s",
+                        (new_hashed_pw, row[0], hashed_pw),
+                    )
+
+    token = create_access_token(subject=row[0], extra_claims={"name": row[1], "email": row[2]})
+
+    # The body always has the Token shape and a JWT is base64url, so
+    # no escaping is needed; response_model still documents it
+    response = Response(
+        content=b'{"access_token":"' + token.encode() + b'","token_type":"bearer"}',
+        media_type="application/json",
+    )
+
+    # Set cookie
+    response.set_cookie(
+        key=COOKIE_NAME,
+        value=token,
+        httponly=True,
+        samesite="lax",
+        secure=False,
+        max_age=60 * 15,
+    )
+    return response
 
 @router.get("/auth/me", response_model=User)
 def me(user: User = Depends(get_current_user)) -> User:
@@ -99,6 +141,13 @@ def me(user: User = Depends(get_current_user)) -> User:
     return user
 
 @router.post("/auth/logout", status_code=204)
-def logout(response: Response) -> None:
-    """Logout by clearing cookie."""
+def logout(request: Request, response: Response) -> None:
+    """Logout by clearing cookie and revoking the token in this worker process."""
+    token = get_request_token(request)
+    if token:
+        try:
+            revoke_token(token)
+        except PyJWTError:
+            # Already invalid or expired, nothing to revoke
+            pass
     response.delete_cookie(COOKIE_NAME)
\ No newline at end of file
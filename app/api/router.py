@@ -3,6 +3,8 @@ from app.api.health import router as health_router
 from app.api.users import router as users_router
 from app.api.auth import router as auth_router
 
+__all__ = ["api"]
+
 api = APIRouter(prefix="/v1")
 api.include_router(health_router, tags=["health"])
 api.include_router(users_router, tags=["users"])
@@ -1,47 +1,113 @@
-from fastapi import APIRouter, status
-from app.schemas.users import User
+import logging
+from typing import AsyncGenerator
+import orjson
+from fastapi import APIRouter, HTTPException, Query, status
+from fastapi.responses import StreamingResponse
+from app.schemas.users import User, UserPage
+from app.core.cache import invalidate_user
 from app.core.database import get_db_connection
 
+logger = logging.getLogger(__name__)
 router = APIRouter()
 
-@router.get("/users", response_model=list[User], status_code=status.HTTP_200_OK)
-async def get_users() -> list[User]:
+@router.get("/users", response_model=UserPage, status_code=status.HTTP_200_OK)
+async def get_users(
+    after: int = Query(0, ge=0, description="Return users with an id greater than this cursor"),
+    limit: int = Query(100, ge=1, le=500),
+) -> UserPage:
     async with get_db_connection() as conn:
-        with conn.cursor() as cur:
-            cur.execute("SELECT * FROM test_users")
-            rows = cur.fetchall()
-            for row in rows:
-                print(f"ID: {row[0]}, Name: {row[1]}, Email: {row[2]}")
-            return [User(id=row[0], name=row[1], email=row[2]) for row in rows]
+        async with conn.cursor() as cur:
+            await cur.execute(
+                "SELECT id, name, email FROM test_users WHERE id > %s ORDER BY id LIMIT %s",
+                (after, limit),
+            )
+            rows = await cur.fetchall()
+            logger.debug("Fetched %d users after id %d", len(rows), after)
+            # Rows come from our own table, so skip re-validating them
+            items = [User.model_construct(id=row[0], name=row[1], email=row[2]) for row in rows]
+            # A short page means there is nothing left to fetch
+            next_cursor = items[-1].id if len(items) == limit else None
+            return UserPage.model_construct(items=items, next_cursor=next_cursor)
+
+# Rows fetched per connection checkout while streaming
+STREAM_BATCH_SIZE = 500
+
+async def _stream_users() -> AsyncGenerator[bytes, None]:
+    after = 0
+    while True:
+        # Fetch one keyset page per checkout and give the connection back
+        # before yielding, so slow readers never hold a pool connection
+        async with get_db_connection() as conn:
+            async with conn.cursor() as cur:
+                await cur.execute(
+                    "SELECT id, name, email FROM test_users WHERE id > %s ORDER BY id LIMIT %s",
+                    (after, STREAM_BATCH_SIZE),
+                )
+                rows = await cur.fetchall()
+        if not rows:
+            return
+        yield b"".join(
+            orjson.dumps({"id": row[0], "name": row[1], "email": row[2]}) + b"\n" for row in rows
+        )
+        if len(rows) < STREAM_BATCH_SIZE:
+            return
+        after = rows[-1][0]
+
+@router.get("/users/stream", response_class=StreamingResponse, status_code=status.HTTP_200_OK)
+async def stream_users() -> StreamingResponse:
+    return StreamingResponse(_stream_users(), media_type="application/x-ndjson")
 
 @router.post("/users", response_model=User, status_code=status.HTTP_201_CREATED)
 async def create_user(user: User) -> User:
     async with get_db_connection() as conn:
-        with conn.cursor() as cur:
-            cur.execute("INSERT INTO test_users (name, email) VALUES (%s, %s)", (user.name, user.email))
-            conn.commit()
+        async with conn.cursor() as cur:
+            async with conn.transaction():
+                await cur.execute("INSERT INTO test_users (name, email) VALUES (%s, %s)", (user.name, user.email))
             return user
 
+@router.post("/users/bulk", response_model=list[User], status_code=status.HTTP_201_CREATED)
+async def create_users_bulk(users: list[User]) -> list[User]:
+    if not users:
+        return []
+    async with get_db_connection() as conn:
+        async with conn.cursor() as cur:
+            async with conn.transaction():
+                await cur.executemany(
+                    "INSERT INTO test_users (name, email) VALUES (%s, %s) RETURNING id, name, email",
+                    [(user.name, user.email) for user in users],
+                    returning=True,
+                )
+            # executemany(returning=True) keeps one result set per inserted row
+            created = []
+            while True:
+                row = await cur.fetchone()
+                if row:
+                    created.append(User.model_construct(id=row[0], name=row[1], email=row[2]))
+                if not cur.nextset():
+                    break
+            return created
+
 @router.put("/users/{user_id}", response_model=User, status_code=status.HTTP_200_OK)
+@router.patch("/users/{user_id}", response_model=User, status_code=status.HTTP_200_OK)
 async def update_user(user_id: int, user: User) -> User:
     async with get_db_connection() as conn:
-        with conn.cursor() as cur:
-            cur.execute("UPDATE test_users SET name = %s, email = %s WHERE id = %s", (user.name, user.email, user_id))
-            conn.commit()
-            return user
+        async with conn.cursor() as cur:
+            async with conn.transaction():
+                await cur.execute(
+                    "UPDATE test_users SET name = %s, email = %s WHERE id = %s RETURNING id, name, email",
+                    (user.name, user.email, user_id),
+                )
+                row = await cur.fetchone()
+            if not row:
+                raise HTTPException(status_code=404, detail="User not found")
+            invalidate_user(user_id)
+            return User.model_construct(id=row[0], name=row[1], email=row[2])
 
 @router.delete("/users/{user_id}", status_code=status.HTTP_204_NO_CONTENT)
 async def delete_user(user_id: int) -> None:
     async with get_db_connection() as conn:
-        with conn.cursor() as cur:
-            cur.execute("DELETE FROM test_users WHERE id = %s", (user_id,))
-            conn.commit()
+        async with conn.cursor() as cur:
+            async with conn.transaction():
+                await cur.execute("DELETE FROM test_users WHERE id = %s", (user_id,))
+            invalidate_user(user_id)
             return None
-
-@router.patch("/users/{user_id}", response_model=User, status_code=status.HTTP_200_OK)
-async def patch_user(user_id: int, user: User) -> User:
-    async with get_db_connection() as conn:
-        with conn.cursor() as cur:
-            cur.execute("UPDATE test_users SET name = %s, email = %s WHERE id = %s", (user.name, user.email, user_id))
-            conn.commit()
-            return user
\ No newline at end of file
@@ -0,0 +1,46 @@
+"""
+In-process caches shared by the API layer.
+
+Entries are per worker process and expire on their own, so they only
+shave database round trips off hot paths and never act as the source
+of truth.
+"""
+
+import threading
+import time
+from typing import Optional
+
+from cachetools import TTLCache
+
+from app.core.security import ACCESS_TOKEN_EXPIRE_MINUTES
+from app.schemas.users import User
+
+# Authenticated users by id, filled by get_current_user
+_user_cache = TTLCache[int, User](maxsize=10_000, ttl=60)
+_user_cache_lock = threading.Lock()
+
+# When each user was last changed, kept for as long as a token can live, so
+# name/email claims in tokens issued before the change are not trusted
+_user_changed_at = TTLCache[int, float](maxsize=10_000, ttl=ACCESS_TOKEN_EXPIRE_MINUTES * 60)
+
+def get_cached_user(user_id: int) -> Optional[User]:
+    """Return the cached user for an id, if present and not expired."""
+    with _user_cache_lock:
+        return _user_cache.get(user_id)
+
+def cache_user(user: User) -> None:
+    """Store a user freshly read from the database."""
+    with _user_cache_lock:
+        _user_cache[user.id] = user
+
+def invalidate_user(user_id: int) -> None:
+    """Drop a user from the cache after it was changed or deleted."""
+    with _user_cache_lock:
+        _user_cache.pop(user_id, None)
+        _user_changed_at[user_id] = time.time()
+
+def user_changed_since(user_id: int, timestamp: float) -> bool:
+    """Whether the user was changed or deleted at or after a given time."""
+    with _user_cache_lock:
+        changed_at = _user_changed_at.get(user_id)
+    return changed_at is not None and changed_at >= timestamp
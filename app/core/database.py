@@ -5,65 +5,82 @@ This module provides database connection pooling functionality
 for the entire application. It's part of the core infrastructure.
 """
 
+import asyncio
+import logging
 import os
 from contextlib import asynccontextmanager
-from typing import AsyncGenerator
+from typing import AsyncGenerator, Optional
 import psycopg
-from psycopg_pool import ConnectionPool
+from psycopg_pool import AsyncConnectionPool
+
+logger = logging.getLogger(__name__)
 
 # Database configuration from environment variables
 DATABASE_URL = os.getenv("DATABASE_URL", "postgresql://merislihic@localhost:5432/learning_db")
 
 # Global connection pool (lazy initialization)
-_connection_pool = None
+_connection_pool: Optional[AsyncConnectionPool[psycopg.AsyncConnection]] = None
+_connection_pool_lock = asyncio.Lock()
 
-def get_connection_pool():
+async def get_connection_pool() -> AsyncConnectionPool[psycopg.AsyncConnection]:
     """
-    Get the connection pool, creating it if it doesn't exist.
-    
+    Get the connection pool, creating and opening it if it doesn't exist.
+
     This uses lazy initialization - the pool is only created
     when first needed, not at import time.
     """
     global _connection_pool
     if _connection_pool is None:
-        _connection_pool = ConnectionPool(
-            DATABASE_URL,
-            min_size=1,
-            max_size=10,    
-        )
+        async with _connection_pool_lock:
+            if _connection_pool is None:
+                pool = AsyncConnectionPool[psycopg.AsyncConnection](
+                    DATABASE_URL,
+                    min_size=5,
+                    max_size=20,
+                    max_idle=60,
+                    num_workers=2,
+                    # Validate connections before handing them out, so a dropped
+                    # server connection does not surface as a failed request
+                    check=AsyncConnectionPool.check_connection,
+                    # Prepare every statement on first use; the app only runs
+                    # a handful of query shapes, so each connection plans them once
+                    kwargs={"prepare_threshold": 0},
+                    open=False,
+                )
+                await pool.open()
+                _connection_pool = pool
+                return pool
     return _connection_pool
 
 @asynccontextmanager
-async def get_db_connection() -> AsyncGenerator[psycopg.Connection, None]:
+async def get_db_connection() -> AsyncGenerator[psycopg.AsyncConnection, None]:
     """
     Context manager for getting a database connection from the pool.
-    
+
     Usage:
         async with get_db_connection() as conn:
-            with conn.cursor() as cur:
-                cur.execute("SELECT * FROM users")
-                results = cur.fetchall()
-    
-    The connection is automatically returned to the pool when the
-    context manager exits.
+            async with conn.cursor() as cur:
+                await cur.execute("SELECT * FROM users")
+                results = await cur.fetchall()
+
+    Waiting for a free connection yields to the event loop instead of
+    blocking it. The connection is automatically returned to the pool
+    when the context manager exits.
     """
-    pool = get_connection_pool()
-    conn = pool.getconn()
-    try:
+    pool = await get_connection_pool()
+    async with pool.connection() as conn:
         yield conn
-    finally:
-        pool.putconn(conn)
 
-def close_connection_pool():
+async def close_connection_pool():
     """
     Close all connections in the pool.
-    
+
     This should be called when the application shuts down
     to properly clean up resources.
     """
     global _connection_pool
     if _connection_pool:
-        print("🔒 Closing all connections in pool...")
-        _connection_pool.close()
+        logger.info("Closing all connections in pool...")
+        await _connection_pool.close()
         _connection_pool = None
-        print("✅ All connections closed")
\ No newline at end of file
+        logger.info("All connections closed")
@@ -2,34 +2,228 @@
 Security utilities for password hashing and JWT token management.
 """
 
+import asyncio
+import hashlib
+import hmac
+import logging
 import os
+import secrets
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime, timedelta, timezone
-from typing import Any, Dict, Optional
+from typing import Any, Dict, Optional, Tuple
 
-from jose import jwt
-from passlib.context import CryptContext
+import bcrypt
+import jwt
+from argon2 import PasswordHasher
+from argon2.exceptions import InvalidHashError, VerificationError
+from cachetools import TTLCache
+from cryptography.hazmat.primitives import serialization
+from cryptography.hazmat.primitives.asymmetric.ed25519 import Ed25519PrivateKey
+
+logger = logging.getLogger(__name__)
 
 # Configuration
-pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
-SECRET_KEY = os.getenv("SECRET_KEY", "CHANGE_ME_DEV_ONLY")
-ALGORITHM = os.getenv("ALGORITHM", "HS256")
+SECRET_KEY = os.getenv("SECRET_KEY", "CHANGE_ME_DEV_ONLY")  # only used by HS* algorithms
+ALGORITHM = os.getenv("ALGORITHM", "EdDSA")
 ACCESS_TOKEN_EXPIRE_MINUTES = int(os.getenv("ACCESS_TOKEN_EXPIRE_MINUTES", "15"))
 
+def _load_jwt_keys() -> Tuple[Any, Any]:
+    """
+    Load the (signing, verification) keys for ALGORITHM.
+
+    Asymmetric algorithms read PEM keys from JWT_PRIVATE_KEY and
+    JWT_PUBLIC_KEY; the public key is derived from the private one when
+    not given, and a service that only verifies tokens needs just the
+    public key. Keys are parsed once here, not on every token.
+    """
+    if ALGORITHM.startswith("HS"):
+        return SECRET_KEY, SECRET_KEY
+
+    private_pem = os.getenv("JWT_PRIVATE_KEY")
+    public_pem = os.getenv("JWT_PUBLIC_KEY")
+    private_key = serialization.load_pem_private_key(private_pem.encode(), password=None) if private_pem else None
+    if public_pem:
+        public_key = serialization.load_pem_public_key(public_pem.encode())
+    elif private_key is not None:
+        public_key = private_key.public_key()
+    elif ALGORITHM == "EdDSA" and os.getenv("ENV") != "prod":
+        # DEV ONLY: tokens do not survive restarts and are not shared between workers
+        logger.warning(
+            "JWT_PRIVATE_KEY is not set; signing tokens with a temporary key. "
+            "Tokens will be rejected by other workers and after a restart."
+        )
+        private_key = Ed25519PrivateKey.generate()
+        public_key = private_key.public_key()
+    else:
+        raise RuntimeError(f"JWT_PRIVATE_KEY or JWT_PUBLIC_KEY must be set for {ALGORITHM}")
+    return private_key, public_key
+
+_SIGNING_KEY, _VERIFY_KEY = _load_jwt_keys()
+
+# Argon2id with the OWASP-recommended minimum parameters (19 MiB, 2 passes).
+# Hashes from before the switch are bcrypt and are upgraded at next login.
+_password_hasher = PasswordHasher(time_cost=2, memory_cost=19456, parallelism=1)
+
+# Verified against when a login email is unknown, so that path costs as much
+# as a wrong password and response times do not reveal registered emails.
+# Built from a random secret so no password can ever match it.
+DUMMY_PASSWORD_HASH = _password_hasher.hash(secrets.token_urlsafe(32))
+
+# Set while test_users still holds bcrypt hashes from before the Argon2id
+# switch. Every check then also runs the other scheme against a dummy, so
+# unmigrated accounts take as long as migrated and unknown ones.
+LEGACY_BCRYPT_HASHES = os.getenv("LEGACY_BCRYPT_HASHES", "").lower() in ("1", "true", "yes")
+
+# Stands in for the bcrypt half of verify_password when the real hash is
+# Argon2id. Cost 12 matches the legacy hashes (bcrypt/passlib default).
+_DUMMY_BCRYPT_HASH = bcrypt.hashpw(secrets.token_urlsafe(32).encode(), bcrypt.gensalt(rounds=12)).decode()
+
+# Dedicated threads for password hashing. argon2 and bcrypt release the GIL
+# while hashing, so slow hashes run off the event loop and cannot starve the
+# default executor used by the rest of the app. The pool is per worker process
+# and each Argon2 hash uses 19 MiB, so the default stays small for the usual
+# one-worker-per-core deployment; raise PASSWORD_HASH_WORKERS only when
+# running fewer workers than cores.
+PASSWORD_HASH_WORKERS = int(os.getenv("PASSWORD_HASH_WORKERS", "2"))
+# Created on first use and dropped on shutdown, like the connection pool,
+# so the app can be started again in the same process
+_password_executor: Optional[ThreadPoolExecutor] = None
+_password_executor_lock = threading.Lock()
+
+# Recent successful verifications, so a user re-authenticating within a
+# minute skips the slow hash. Keys are HMACs under a per-process random key,
+# so no password is kept in memory; failures are never cached, so this is
+# no help to password guessing. A changed password produces a new hash and
+# therefore a new key.
+_verify_cache_key = secrets.token_bytes(32)
+_verified_cache = TTLCache[bytes, bool](maxsize=10_000, ttl=60)
+_verified_cache_lock = threading.Lock()
+
+# Decoded payloads keyed by token digest, so a token presented repeatedly
+# is only signature-checked once a minute
+_token_cache = TTLCache[bytes, Dict[str, Any]](maxsize=50_000, ttl=60)
+_token_cache_lock = threading.Lock()
+
+# JTIs of tokens revoked at logout; entries outlive the tokens they block.
+# Per process: other workers keep accepting a revoked token until it expires.
+_revoked_jtis = TTLCache[str, bool](maxsize=100_000, ttl=ACCESS_TOKEN_EXPIRE_MINUTES * 60)
+
 def hash_password(password: str) -> str:
-    """Hash a password using bcrypt."""
-    return pwd_context.hash(password)
+    """Hash a password using Argon2id."""
+    return _password_hasher.hash(password)
+
+def _verify_argon2(password: str, hashed_password: str) -> bool:
+    try:
+        return _password_hasher.verify(hashed_password, password)
+    except (VerificationError, InvalidHashError):
+        return False
+
+def _verify_bcrypt(password: str, hashed_password: str) -> bool:
+    # bcrypt only ever used the first 72 bytes; newer bcrypt releases raise
+    # instead of truncating, so truncate here to keep old hashes verifying
+    return bcrypt.checkpw(password.encode()[:72], hashed_password.encode())
 
 def verify_password(password: str, hashed_password: str) -> bool:
-    """Verify a password against its hash."""
-    return pwd_context.verify(password, hashed_password)
+    """
+    Verify a password against its Argon2id or legacy bcrypt hash.
+
+    With LEGACY_BCRYPT_HASHES set, both algorithms run on every call, the
+    unused one against a dummy hash, so the time taken is the same for
+    migrated accounts, accounts still on bcrypt and unknown emails
+    (verified against DUMMY_PASSWORD_HASH).
+    """
+    if hashed_password.startswith("$argon2"):
+        if LEGACY_BCRYPT_HASHES:
+            _verify_bcrypt(password, _DUMMY_BCRYPT_HASH)
+        return _verify_argon2(password, hashed_password)
+    if LEGACY_BCRYPT_HASHES:
+        _verify_argon2(password, DUMMY_PASSWORD_HASH)
+    return _verify_bcrypt(password, hashed_password)
+
+def password_needs_rehash(hashed_password: str) -> bool:
+    """Whether a hash is legacy bcrypt or uses outdated Argon2 parameters."""
+    if not hashed_password.startswith("$argon2"):
+        return True
+    return _password_hasher.check_needs_rehash(hashed_password)
+
+def _get_password_executor() -> ThreadPoolExecutor:
+    """Get the password hashing executor, creating it if it doesn't exist."""
+    global _password_executor
+    with _password_executor_lock:
+        if _password_executor is None:
+            _password_executor = ThreadPoolExecutor(max_workers=PASSWORD_HASH_WORKERS, thread_name_prefix="password-hash")
+        return _password_executor
 
-def create_access_token(subject: str | int, expires_delta: Optional[timedelta] = None) -> str:
-    """Create a JWT access token for a user."""
-    to_encode: Dict[str, Any] = {"sub": str(subject)}
-    expire = datetime.now(timezone.utc) + (expires_delta or timedelta(minutes=ACCESS_TOKEN_EXPIRE_MINUTES))
-    to_encode.update({"exp": expire})
-    return jwt.encode(to_encode, SECRET_KEY, algorithm=ALGORITHM)
+async def hash_password_async(password: str) -> str:
+    """Hash a password in a worker thread, keeping the event loop free."""
+    return await asyncio.get_running_loop().run_in_executor(_get_password_executor(), hash_password, password)
+
+async def verify_password_async(password: str, hashed_password: str) -> bool:
+    """Verify a password in a worker thread, keeping the event loop free."""
+    if hashed_password is DUMMY_PASSWORD_HASH:
+        # Never cached: a fast answer here would single out unknown emails
+        return await asyncio.get_running_loop().run_in_executor(_get_password_executor(), verify_password, password, hashed_password)
+    key = hmac.new(_verify_cache_key, hashed_password.encode() + b"\0" + password.encode(), "sha256").digest()
+    with _verified_cache_lock:
+        if key in _verified_cache:
+            return True
+    verified = await asyncio.get_running_loop().run_in_executor(_get_password_executor(), verify_password, password, hashed_password)
+    if verified:
+        with _verified_cache_lock:
+            _verified_cache[key] = True
+    return verified
+
+def shutdown_password_executor() -> None:
+    """Wait for in-flight password hashes and stop the hashing threads."""
+    global _password_executor
+    with _password_executor_lock:
+        executor, _password_executor = _password_executor, None
+    if executor is not None:
+        executor.shutdown(wait=True)
+
+def create_access_token(
+    subject: str | int,
+    expires_delta: Optional[timedelta] = None,
+    extra_claims: Optional[Dict[str, Any]] = None,
+) -> str:
+    """Create a JWT access token for a user, with optional extra claims."""
+    to_encode: Dict[str, Any] = dict(extra_claims or {})
+    now = datetime.now(timezone.utc)
+    expire = now + (expires_delta or timedelta(minutes=ACCESS_TOKEN_EXPIRE_MINUTES))
+    to_encode.update({"sub": str(subject), "jti": secrets.token_urlsafe(16), "iat": now, "exp": expire})
+    return jwt.encode(to_encode, _SIGNING_KEY, algorithm=ALGORITHM)
+
+def _token_cache_key(token: str) -> bytes:
+    return hashlib.blake2b(token.encode(), digest_size=16).digest()
 
 def decode_token(token: str) -> Dict[str, Any]:
-    """Decode and validate a JWT token."""
-    return jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
\ No newline at end of file
+    """Decode and validate a JWT token, rejecting revoked ones."""
+    key = _token_cache_key(token)
+    with _token_cache_lock:
+        payload = _token_cache.get(key)
+    if payload is None:
+        payload = jwt.decode(token, _VERIFY_KEY, algorithms=[ALGORITHM], options={"require": ["exp", "sub"]})
+        with _token_cache_lock:
+            _token_cache[key] = payload
+    else:
+        exp = payload.get("exp")
+        if exp is not None and exp <= time.time():
+            raise jwt.ExpiredSignatureError("Signature has expired")
+
+    with _token_cache_lock:
+        revoked = payload.get("jti") in _revoked_jtis
+    if revoked:
+        raise jwt.InvalidTokenError("Token has been revoked")
+    return payload
+
+def revoke_token(token: str) -> None:
+    """Revoke a token so it is rejected until it would have expired anyway."""
+    payload = decode_token(token)
+    jti = payload.get("jti")
+    if not jti:
+        return
+    with _token_cache_lock:
+        _revoked_jtis[jti] = True
+        _token_cache.pop(_token_cache_key(token), None)
@@ -1,27 +1,46 @@
+import os
+from dotenv import load_dotenv
+
+# Load .env before importing modules that read their configuration at
+# import time. Variables already set in the environment take precedence.
+load_dotenv()
+
+import logging
 from contextlib import asynccontextmanager
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
-from dotenv import load_dotenv
+from fastapi.responses import ORJSONResponse
 from .api.router import api
 from .core.database import close_connection_pool
-import os
+from .core.security import shutdown_password_executor
 
-load_dotenv()
+logger = logging.getLogger(__name__)
+
+# API docs and the OpenAPI schema are not served in production
+DOCS_ENABLED = os.getenv("ENV") != "prod"
 
 @asynccontextmanager
 async def lifespan(app: FastAPI):
     # Startup
-    print("🚀 Starting up...")
+    logger.info("Starting up...")
+    if DOCS_ENABLED:
+        # Build the OpenAPI schema now rather than on the first docs request
+        app.openapi()
     yield
     # Shutdown
-    print("🛑 Shutting down...")
-    close_connection_pool()
+    logger.info("Shutting down...")
+    await close_connection_pool()
+    shutdown_password_executor()
 
 app = FastAPI(
     title="Bug-Free Blog API", 
     description="A robust blog backend API with authentication and user management", 
     version="1.0.0",
-    lifespan=lifespan
+    lifespan=lifespan,
+    default_response_class=ORJSONResponse,
+    docs_url="/docs" if DOCS_ENABLED else None,
+    redoc_url="/redoc" if DOCS_ENABLED else None,
+    openapi_url="/openapi.json" if DOCS_ENABLED else None,
 )
 
 # Add CORS middleware
@@ -38,8 +57,9 @@ app.add_middleware(
         # "https://your-frontend-domain.com"
     ],
     allow_credentials=True,
-    allow_methods=["GET", "POST", "PUT", "DELETE", "OPTIONS"],
-    allow_headers=["*"],
+    allow_methods=["GET", "POST", "PUT", "PATCH", "DELETE"],
+    allow_headers=["Authorization", "Content-Type"],
+    max_age=86400,  # let browsers cache preflight responses for a day
 )
 
 app.include_router(api)
@@ -7,7 +7,32 @@ These models define the structure of data for:
 - JWT token responses
 """
 
-from pydantic import BaseModel, EmailStr
+import re
+from typing import Annotated
+
+from pydantic import AfterValidator, BaseModel, ConfigDict, StringConstraints
+
+# Compiled once; a plain syntax check instead of EmailStr's
+# email-validator parsing on every request. Domain labels cannot contain
+# dots, so the pattern never backtracks and runs in linear time.
+_EMAIL_RE = re.compile(r"[^@\s]+@[^@\s.]+(?:\.[^@\s.]+)+")
+
+def _validate_email(value: str) -> str:
+    """Check email syntax and lowercase the domain, like EmailStr did."""
+    if not _EMAIL_RE.fullmatch(value):
+        raise ValueError("value is not a valid email address")
+    local, _, domain = value.rpartition("@")
+    # str.isascii() is a constant-time flag check, so only internationalized
+    # domains pay for the IDNA encoding check
+    if not domain.isascii():
+        try:
+            domain.encode("idna")
+        except UnicodeError:
+            raise ValueError("value is not a valid email address") from None
+    return f"{local}@{domain.lower()}"
+
+# The length cap (RFC 5321 maximum) runs before the regex
+Email = Annotated[str, StringConstraints(max_length=254), AfterValidator(_validate_email)]
 
 class RegisterInput(BaseModel):
     """
@@ -15,11 +40,13 @@ class RegisterInput(BaseModel):
     
     Fields:
         name: User's full name
-        email: Valid email address (validated by EmailStr)
+        email: Valid email address (domain is lowercased)
         password: Plain text password (will be hashed before storage)
     """
+    model_config = ConfigDict(frozen=True, extra="forbid")
+
     name: str
-    email: EmailStr
+    email: Email
     password: str
 
 class LoginInput(BaseModel):
@@ -30,7 +57,9 @@ class LoginInput(BaseModel):
         email: User's email address
         password: Plain text password (will be verified against hash)
     """
-    email: EmailStr
+    model_config = ConfigDict(frozen=True, extra="forbid")
+
+    email: Email
     password: str
 
 class Token(BaseModel):
@@ -41,5 +70,7 @@ class Token(BaseModel):
         access_token: JWT token string
         token_type: Always "bearer" for JWT tokens
     """
+    model_config = ConfigDict(frozen=True)
+
     access_token: str
     token_type: str = "bearer"
\ No newline at end of file
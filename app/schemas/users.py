@@ -1,6 +1,14 @@
-from pydantic import BaseModel
+from typing import Optional
+from pydantic import BaseModel, ConfigDict
 
 class User(BaseModel):
+    # Instances are shared through the in-process user cache
+    model_config = ConfigDict(frozen=True)
+
     id: int
     name: str
-    email: str
\ No newline at end of file
+    email: str
+
+class UserPage(BaseModel):
+    items: list[User]
+    next_cursor: Optional[int] = None
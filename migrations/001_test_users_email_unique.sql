@@ -0,0 +1,3 @@
+-- Registration relies on ON CONFLICT (email), which needs a unique index.
+-- Remove any duplicate emails before applying.
+CREATE UNIQUE INDEX IF NOT EXISTS test_users_email_key ON test_users (email);